@@ -1,26 +1,64 @@
 import discord
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import atexit
 from discord.ext import commands
 import google.generativeai as genai
-import json
+from google.generativeai.types import HarmBlockThreshold, HarmCategory
+from google.api_core import exceptions as google_exceptions
+import orjson
 import asyncio
-from datetime import datetime
-from collections import defaultdict
+import heapq
+import operator
+import re
+import time
+from datetime import datetime, timezone
+from collections import deque
+from hashlib import blake2b
+from cachetools import LRUCache, TTLCache
+import aiosqlite
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Configuration/intents for the bot
-handler = logging.FileHandler(filename='discord.log', encoding='utf-8', mode='w')
+# File writes happen on a listener thread so logging never blocks the event loop
+log_queue = queue.Queue(-1)
+log_formatter = logging.Formatter('[{asctime}] [{levelname:<8}] {name}: {message}', '%Y-%m-%d %H:%M:%S', style='{')
+file_handler = logging.FileHandler(filename='discord.log', encoding='utf-8', mode='w')
+file_handler.setFormatter(log_formatter)
+# Warnings and errors also go to stderr so operators see them (the log file is ephemeral on Render)
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.WARNING)
+console_handler.setFormatter(log_formatter)
+log_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+handler = QueueHandler(log_queue)
+
+# discord.py's logger and the bot's own logger both go through the queue. Records are formatted
+# by the listener's handlers, so discord.py is not given the handler (it would format them first).
+for logger_name in ("discord", "guardian"):
+    logging.getLogger(logger_name).setLevel(logging.INFO)
+    logging.getLogger(logger_name).addHandler(handler)
+log = logging.getLogger("guardian")
 intents = discord.Intents.default()
 intents.message_content = True
-intents.members = True
+intents.members = True  # Needed for on_member_join
 
-bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
+# Don't chunk or cache every guild member; members are fetched on demand instead
+bot = commands.Bot(
+    command_prefix='!',
+    intents=intents,
+    help_command=None,
+    member_cache_flags=discord.MemberCacheFlags.none(),
+    chunk_guilds_at_startup=False
+)
 
-# Storage for user violations
-user_violations = defaultdict(int)
+# Storage for user violations (bounded so departed users eventually drop out)
+user_violations = LRUCache(maxsize=50_000)
 
 # Configuration settings
 config = {
@@ -29,15 +67,219 @@ config = {
     "auto_mute_violations": 3,
     "mute_duration": 600,
     "mod_log_channel": None,
-    "enabled": True
+    "enabled": True,
+    "prefilter_threshold": 1.0
 }
 
 # Message tracking for spam detection
-user_messages = defaultdict(list)
+# Entries older than a minute are useless since the spam window is 10s
+user_messages = TTLCache(maxsize=50_000, ttl=60)
+CLEANUP_INTERVAL = 300
+
+# Members fetched from the API, kept briefly so repeated lookups don't hit Discord
+fetched_members = TTLCache(maxsize=1000, ttl=60)
+
+# Muted role id per guild, so muting doesn't rescan the role list
+muted_role_cache = {}
+
+# Pending unmutes as a heap of (unmute_at, guild_id, user_id), persisted so they survive restarts.
+# unmute_at is wall-clock time because it has to stay meaningful across restarts.
+UNMUTE_DB = "unmutes.db"
+CREATE_UNMUTES_TABLE = (
+    "CREATE TABLE IF NOT EXISTS pending_unmutes ("
+    "guild_id INTEGER, user_id INTEGER, unmute_at REAL, PRIMARY KEY (guild_id, user_id))"
+)
+UNMUTE_RETRY_DELAY = 30
+UNMUTE_MAX_RETRY_DELAY = 3600
+unmute_heap = []
+pending_unmutes = {}
+unmute_retries = {}
+unmute_event = None  # Created in setup_hook, on the bot's event loop
+unmute_task = None
 
 # Gemini API setup
 genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-model = genai.GenerativeModel('gemini-pro')
+
+# Structured output: Gemini must return a list of verdicts matching this schema
+VERDICT_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "id": {"type": "string"},
+            "toxicity_score": {"type": "number"},
+            "categories": {"type": "array", "items": {"type": "string"}},
+            "reason": {"type": "string"},
+        },
+        "required": ["id", "toxicity_score", "categories", "reason"],
+    },
+}
+
+# Kept short and byte-identical across calls; the schema already describes the output shape
+MODERATION_INSTRUCTION = (
+    "You are a content moderator. For each message, return its id, toxicity_score (0 safe to 1 highly toxic), "
+    "categories (hate_speech, harassment, spam, threats, nsfw) and a brief reason. "
+    "Flag only clearly problematic content, considering context and intent."
+)
+MODERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=VERDICT_SCHEMA
+)
+
+# The models must see toxic content to score it, so Gemini's own safety blocking is off
+MODERATION_SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+}
+
+# A small, fast model decides most messages; borderline scores get a second opinion.
+# Keep these on currently served model IDs; retired models fail every request.
+GEMINI_MODELS = {
+    "triage": "gemini-2.5-flash-lite",
+    "review": "gemini-2.5-flash",
+}
+triage_model = genai.GenerativeModel(
+    GEMINI_MODELS["triage"],
+    system_instruction=MODERATION_INSTRUCTION,
+    generation_config=MODERATION_CONFIG,
+    safety_settings=MODERATION_SAFETY_SETTINGS
+)
+review_model = genai.GenerativeModel(
+    GEMINI_MODELS["review"],
+    system_instruction=MODERATION_INSTRUCTION,
+    generation_config=MODERATION_CONFIG,
+    safety_settings=MODERATION_SAFETY_SETTINGS
+)
+
+# Scores this close to the live toxicity threshold get reviewed by the stronger model
+REVIEW_MARGIN = 0.2
+
+# Words that are always removed, including compounds and inflections ("bullshit", "bitchy")
+BANNED_WORDS = ["shit", "bitch", "whore"]
+BANNED_RE = re.compile(
+    r"\b\w*(?:" + "|".join(re.escape(w) for w in BANNED_WORDS) + r")\w*\b",
+    re.IGNORECASE
+)
+
+# Local pre-filter: only messages that look suspicious get sent to Gemini
+SUSPICIOUS_WORDS = [
+    "idiot", "stupid", "moron", "retard", "loser", "dumb", "hate", "kill",
+    "die", "kys", "ugly", "trash", "pathetic", "fuck", "damn", "bastard",
+    "slut", "cunt", "dick", "pussy", "nigger", "faggot", "nazi", "rape",
+    "porn", "nude", "nudes", "sex", "shut up", "free nitro",
+]
+SUSPICIOUS_RE = re.compile(
+    # Stems match with any suffix so inflected forms ("fucking", "idiots", "killing") are caught too
+    r"\b(?:" + "|".join(re.escape(w) for w in SUSPICIOUS_WORDS) + r")\w*",
+    re.IGNORECASE
+)
+EMOJI_ONLY_RE = re.compile(r"(?:\s|<a?:\w+:\d+>|[\U0001F000-\U0001FAFF\u2600-\u27BF\u200d\ufe0f])*")
+URL_RE = re.compile(r"https?://|discord\.gg/", re.IGNORECASE)
+UPPER_RE = re.compile(r"[A-Z]")
+LETTER_RE = re.compile(r"[A-Za-z]")
+
+
+# Micro-batching of AI analysis: messages arriving within a short window share one request
+BATCH_WINDOW = 0.15
+BATCH_MAX_SIZE = 20
+toxicity_queue = None  # Created in setup_hook, on the bot's event loop
+batcher_task = None
+batch_tasks = set()
+cleanup_task = None
+
+ANALYSIS_FAILED = {"toxicity_score": 0, "categories": [], "reason": "Analysis failed"}
+
+# Verdict cache for repeated content (copypasta, memes, one-word reactions)
+analysis_cache = TTLCache(maxsize=10_000, ttl=3600)
+
+# Errors worth retrying with backoff
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class GeminiDispatcher:
+    """Throttles Gemini requests to stay within concurrency, request and token budgets"""
+
+    def __init__(self, max_concurrent=10, max_requests_per_minute=60, max_tokens_per_minute=60000,
+                 max_attempts=3, base_delay=1.0):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.lock = asyncio.Lock()
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.available_requests = float(max_requests_per_minute)
+        self.available_tokens = float(max_tokens_per_minute)
+        self.last_update = time.monotonic()
+
+    def _refill(self):
+        """Top up both buckets for the time elapsed since the last update"""
+        now = time.monotonic()
+        elapsed = now - self.last_update
+        self.last_update = now
+        self.available_requests = min(
+            self.max_requests_per_minute,
+            self.available_requests + self.max_requests_per_minute * elapsed / 60
+        )
+        self.available_tokens = min(
+            self.max_tokens_per_minute,
+            self.available_tokens + self.max_tokens_per_minute * elapsed / 60
+        )
+
+    async def _acquire(self, tokens):
+        """Wait until the budget allows one more request of the given size"""
+        tokens = min(tokens, self.max_tokens_per_minute)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.available_requests >= 1 and self.available_tokens >= tokens:
+                    self.available_requests -= 1
+                    self.available_tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self.available_requests) * 60 / self.max_requests_per_minute,
+                    (tokens - self.available_tokens) * 60 / self.max_tokens_per_minute,
+                    0.01
+                )
+                await asyncio.sleep(wait)
+
+    async def submit(self, model, prompt):
+        """Send a prompt to Gemini, retrying rate limits and outages with exponential backoff"""
+        # Rough token estimate (~4 characters per token)
+        tokens = len(prompt) // 4 + 1
+        async with self.semaphore:
+            for attempt in range(self.max_attempts):
+                await self._acquire(tokens)
+                try:
+                    return await model.generate_content_async(prompt)
+                except RETRYABLE_ERRORS:
+                    if attempt == self.max_attempts - 1:
+                        raise
+                    await asyncio.sleep(self.base_delay * 2 ** attempt)
+
+
+dispatcher = None  # Created in setup_hook, on the bot's event loop
+
+
+@bot.event
+async def setup_hook():
+    global toxicity_queue, dispatcher, unmute_event, batcher_task, cleanup_task, unmute_task
+    # asyncio primitives are created here rather than at import time: before Python 3.10
+    # they bind to the loop current at creation, which isn't the one bot.run() uses
+    toxicity_queue = asyncio.Queue()
+    dispatcher = GeminiDispatcher()
+    unmute_event = asyncio.Event()
+
+    # Runs once before connecting, so no message is handled before this is in place
+    await load_pending_unmutes()
+    batcher_task = asyncio.create_task(toxicity_batcher())
+    cleanup_task = asyncio.create_task(cleanup_caches())
+    unmute_task = asyncio.create_task(unmute_worker())
 
 
 @bot.event
@@ -47,48 +289,167 @@ async def on_ready():
     try:
         synced = await bot.tree.sync()
         print(f"Synced {len(synced)} command(s)")
-    except Exception as e:
-        print(f"Failed to sync commands: {e}")
-
-
-async def analyze_message_toxicity(content):
-    """Analyze message using Gemini for toxicity detection"""
-    try:
-        prompt = f"""You are a content moderation AI. Analyze the following message and return ONLY a JSON object with:
-- toxicity_score: 0-1 (0 = safe, 1 = highly toxic)
-- categories: list of issues found (hate_speech, harassment, spam, threats, nsfw, etc)
-- reason: brief explanation
-
-Only flag genuinely problematic content. Consider context and intent.
-
-Message to analyze: {content}
+    except Exception:
+        log.exception("Failed to sync commands")
 
-Return ONLY the JSON object, no other text."""
 
-        response = model.generate_content(prompt)
-        result_text = response.text.strip()
+async def analyze_message_toxicity(messages, model=triage_model):
+    """Analyze a batch of (message_id, content) pairs using Gemini for toxicity detection.
 
-        # Remove markdown code blocks if present
-        if result_text.startswith('```json'):
-            result_text = result_text[7:]
-        if result_text.startswith('```'):
-            result_text = result_text[3:]
-        if result_text.endswith('```'):
-            result_text = result_text[:-3]
-
-        result = json.loads(result_text.strip())
-        return result
-    except Exception as e:
-        print(f"Error analyzing message: {e}")
-        return {"toxicity_score": 0, "categories": [], "reason": "Analysis failed"}
+    Returns None if the request itself failed, so callers don't retry into an outage.
+    """
+    try:
+        # The system instruction carries the task, so the prompt is just the messages
+        prompt = orjson.dumps([{"id": str(msg_id), "text": content} for msg_id, content in messages]).decode()
+        response = await dispatcher.submit(model, prompt)
+        verdicts = orjson.loads(response.text)
+        return {verdict["id"]: verdict for verdict in verdicts}
+    except google_exceptions.GoogleAPIError:
+        # The dispatcher has already retried; quota or outage errors apply to the whole request
+        log.exception("Error analyzing messages")
+        return None
+    except (ValueError, KeyError, TypeError):
+        # ValueError covers responses Gemini refused to return or that didn't parse
+        log.exception("Error analyzing messages")
+        return {}
+
+
+def content_key(content):
+    """Hash of the normalized message content, used as the cache key"""
+    return blake2b(content.strip().lower().encode(), digest_size=16).digest()
+
+
+async def analyze_with_fallback(messages, model=triage_model):
+    """Analyze a batch, retrying one by one any messages the batch request didn't return"""
+    results = await analyze_message_toxicity(messages, model)
+    if results is None:
+        # Splitting a failed request would only multiply traffic against the same failure
+        return {}
+
+    missing = [(msg_id, content) for msg_id, content in messages if str(msg_id) not in results]
+    if missing and len(messages) > 1:
+        # One bad message must not clear the rest of its batch
+        for single in await asyncio.gather(*(analyze_message_toxicity([item], model) for item in missing)):
+            results.update(single or {})
+    return results
+
+
+async def resolve_batch(batch):
+    """Analyze a batch and hand each waiting caller its verdict"""
+    results = {}
+    try:
+        results = await analyze_with_fallback([(msg_id, content) for msg_id, content, _ in batch])
+
+        # Escalate borderline verdicts to the stronger model
+        borderline = [
+            (msg_id, content) for msg_id, content, _ in batch
+            if str(msg_id) in results
+            and abs(results[str(msg_id)]["toxicity_score"] - config["toxicity_threshold"]) < REVIEW_MARGIN
+        ]
+        if borderline:
+            results.update(await analyze_with_fallback(borderline, review_model))
+    finally:
+        for msg_id, content, future in batch:
+            result = results.get(str(msg_id))
+            if result is not None:
+                analysis_cache[content_key(content)] = result
+            if not future.done():
+                future.set_result(result or ANALYSIS_FAILED)
+
+
+async def toxicity_batcher():
+    """Collect queued messages for up to BATCH_WINDOW seconds and analyze them together"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await toxicity_queue.get()]
+        deadline = loop.time() + BATCH_WINDOW
+        while len(batch) < BATCH_MAX_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(toxicity_queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        # Keep a reference so the task isn't garbage-collected while callers wait on it
+        task = asyncio.create_task(resolve_batch(batch))
+        batch_tasks.add(task)
+        task.add_done_callback(batch_tasks.discard)
+
+
+async def enqueue_toxicity(msg_id, content):
+    """Queue a message for batched analysis and wait for its verdict"""
+    cached = analysis_cache.get(content_key(content))
+    if cached is not None:
+        return cached
+
+    future = asyncio.get_running_loop().create_future()
+    await toxicity_queue.put((msg_id, content, future))
+    return await future
+
+
+def prefilter_score(content):
+    """Cheap local suspicion score used to decide whether a message needs AI analysis"""
+    score = 0.0
+
+    # Word list hits are the strongest signal
+    if SUSPICIOUS_RE.search(content):
+        score += 1.0
+
+    # Shouting: mostly caps over a reasonably long message
+    letters = len(LETTER_RE.findall(content))
+    if letters > 20 and len(UPPER_RE.findall(content)) / letters > 0.7:
+        score += 1.0
+
+    # Link-heavy messages are often scams or spam
+    if len(URL_RE.findall(content)) >= 2:
+        score += 1.0
+
+    return score
+
+
+async def cleanup_caches():
+    """Periodically sweep expired spam-tracking entries"""
+    while True:
+        await asyncio.sleep(CLEANUP_INTERVAL)
+        user_messages.expire()
 
 
 async def check_spam(user_id):
     """Check if user is spamming"""
-    current_time = datetime.now().timestamp()
-    user_messages[user_id] = [t for t in user_messages[user_id] if current_time - t < 10]
-    user_messages[user_id].append(current_time)
-    return len(user_messages[user_id]) >= config["spam_threshold"]
+    current_time = time.monotonic()
+    timestamps = user_messages.get(user_id)
+    if timestamps is None:
+        timestamps = deque(maxlen=64)
+    # Re-insert on every message so active users don't expire mid-window
+    user_messages[user_id] = timestamps
+    while timestamps and current_time - timestamps[0] >= 10:
+        timestamps.popleft()
+    timestamps.append(current_time)
+    return len(timestamps) >= config["spam_threshold"]
+
+
+async def resolve_member(guild, user_id):
+    """Look up a guild member, falling back to the API since the member cache is disabled"""
+    member = guild.get_member(user_id) or fetched_members.get((guild.id, user_id))
+    if member:
+        return member
+    try:
+        member = await guild.fetch_member(user_id)
+    except discord.NotFound:
+        return None
+    fetched_members[(guild.id, user_id)] = member
+    return member
+
+
+async def resolve_members(guild, user_ids):
+    """Look up several members concurrently; members who left come back as None, failed lookups as the error"""
+    members = await asyncio.gather(*(resolve_member(guild, user_id) for user_id in user_ids), return_exceptions=True)
+    for user_id, member in zip(user_ids, members):
+        # resolve_member already maps NotFound (left the server) to None
+        if isinstance(member, Exception):
+            log.error("Error fetching member %s", user_id, exc_info=member)
+    return members
 
 
 async def log_to_mod_channel(guild, embed):
@@ -105,37 +466,40 @@ async def on_message(message):
     if message.author == bot.user:
         return
 
-    # Process commands first
-    await bot.process_commands(message)
-
-    if "shit" in message.content.lower():
+    # Banned words are removed before anything else, including commands
+    if BANNED_RE.search(message.content):
         await message.delete()
         await message.channel.send(f"{message.author.mention} - don't use that word!")
         return
 
+    # Check for spam (skipped if GuardianServer+ is disabled)
+    if config["enabled"]:
+        is_spam = await check_spam(message.author.id)
+        if is_spam:
+            await handle_violation(message, "spam", "Rapid message sending detected", 0.9)
+            return
 
-    if "bitch" in message.content.lower():
-        await message.delete()
-        await message.channel.send(f"{message.author.mention} - don't use that word!")
-        return
-
-    if "whore" in message.content.lower():
-        await message.delete()
-        await message.channel.send(f"{message.author.mention} - don't use that word!")
+    # Valid commands are handled here and never sent for AI analysis
+    ctx = await bot.get_context(message)
+    if ctx.valid:
+        # process_commands ignores other bots, so only humans can run commands
+        await bot.process_commands(message)
         return
 
     # Skip if GuardianServer+ is disabled
     if not config["enabled"]:
         return
 
-    # Check for spam
-    is_spam = await check_spam(message.author.id)
-    if is_spam:
-        await handle_violation(message, "spam", "Rapid message sending detected", 0.9)
+    # Emoji-only messages are never worth analyzing
+    if EMOJI_ONLY_RE.fullmatch(message.content):
+        return
+
+    # Only escalate suspicious messages to the AI
+    if prefilter_score(message.content) < config["prefilter_threshold"]:
         return
 
     # Analyze message with AI
-    analysis = await analyze_message_toxicity(message.content)
+    analysis = await enqueue_toxicity(message.id, message.content)
 
     if analysis["toxicity_score"] >= config["toxicity_threshold"]:
         await handle_violation(
@@ -148,22 +512,47 @@ async def on_message(message):
 
 @bot.event
 async def on_member_join(member):
+    sends = []
+
     # Send welcome message to a channel (you can set which channel)
     # Option 1: Send to system channel (default welcome channel)
     if member.guild.system_channel:
-        await member.guild.system_channel.send(f"Welcome {member.mention}! WE HOPE YOU BROUGHT SOME PASTA 🍝")
+        sends.append(member.guild.system_channel.send(f"Welcome {member.mention}! WE HOPE YOU BROUGHT SOME PASTA 🍝"))
 
     # Option 2: Also send a DM to the user
-    try:
-        await member.send(f"{member.name}, WE HOPE YOU BROUGHT SOME PASTA 🍝")
-    except discord.Forbidden:
-        print(f"Could not DM {member.name}")
+    sends.append(member.send(f"{member.name}, WE HOPE YOU BROUGHT SOME PASTA 🍝"))
+
+    # Both messages are independent, so send them concurrently
+    *channel_results, dm_result = await asyncio.gather(*sends, return_exceptions=True)
+    if isinstance(dm_result, discord.Forbidden):
+        log.info("Could not DM %s", member.name)
+    elif isinstance(dm_result, Exception):
+        log.error("Error welcoming member", exc_info=dm_result)
+    for result in channel_results:
+        if isinstance(result, Exception):
+            log.error("Error welcoming member", exc_info=result)
+
+
+# Static parts of the violation log embed
+VIOLATION_EMBED_TEMPLATE = {
+    "title": "🚨 Content Violation Detected",
+    "color": discord.Color.red().value,
+}
+VIOLATION_EMBED_FIELDS = (
+    {"name": "User", "inline": False},
+    {"name": "Channel", "inline": True},
+    {"name": "Violation Type", "inline": True},
+    {"name": "Toxicity Score", "inline": True},
+    {"name": "Reason", "inline": False},
+    {"name": "Message Content", "inline": False},
+    {"name": "Violation Count", "inline": True},
+)
 
 
 async def handle_violation(message, violation_type, reason, score):
     """Handle a content violation"""
-    user_violations[message.author.id] += 1
-    violation_count = user_violations[message.author.id]
+    violation_count = user_violations.get(message.author.id, 0) + 1
+    user_violations[message.author.id] = violation_count
 
     # Delete the message
     try:
@@ -171,20 +560,22 @@ async def handle_violation(message, violation_type, reason, score):
     except:
         pass
 
-    # Create log embed
-    embed = discord.Embed(
-        title="🚨 Content Violation Detected",
-        color=discord.Color.red(),
-        timestamp=datetime.now()
+    # Create log embed from the static layout, filling in only the values
+    values = (
+        f"{message.author.mention} ({message.author})",
+        message.channel.mention,
+        violation_type,
+        f"{score:.2f}",
+        reason,
+        message.content[:1024],
+        f"{violation_count}/{config['auto_mute_violations']}",
     )
-    embed.add_field(name="User", value=f"{message.author.mention} ({message.author})", inline=False)
-    embed.add_field(name="Channel", value=message.channel.mention, inline=True)
-    embed.add_field(name="Violation Type", value=violation_type, inline=True)
-    embed.add_field(name="Toxicity Score", value=f"{score:.2f}", inline=True)
-    embed.add_field(name="Reason", value=reason, inline=False)
-    embed.add_field(name="Message Content", value=message.content[:1024], inline=False)
-    embed.add_field(name="Violation Count", value=f"{violation_count}/{config['auto_mute_violations']}", inline=True)
-    embed.set_footer(text=f"User ID: {message.author.id}")
+    embed = discord.Embed.from_dict({
+        **VIOLATION_EMBED_TEMPLATE,
+        "fields": [{**field, "value": value} for field, value in zip(VIOLATION_EMBED_FIELDS, values)],
+        "footer": {"text": f"User ID: {message.author.id}"},
+    })
+    embed.timestamp = datetime.now(timezone.utc)
 
     # Log to mod channel
     await log_to_mod_channel(message.guild, embed)
@@ -214,30 +605,147 @@ async def auto_mute_user(guild, member):
     """Automatically mute a user"""
     try:
         # Get or create muted role
-        muted_role = discord.utils.get(guild.roles, name="Muted")
+        role_id = muted_role_cache.get(guild.id)
+        muted_role = guild.get_role(role_id) if role_id else None
+        if not muted_role:
+            muted_role = discord.utils.get(guild.roles, name="Muted")
         if not muted_role:
             muted_role = await guild.create_role(name="Muted", reason="Auto-mute by Server Guardian+")
-            # Set permissions for muted role
-            for channel in guild.channels:
-                await channel.set_permissions(muted_role, speak=False, send_messages=False)
+            # Set permissions for muted role on all channels at once
+            await asyncio.gather(*(
+                channel.set_permissions(muted_role, speak=False, send_messages=False)
+                for channel in guild.channels
+            ))
+        muted_role_cache[guild.id] = muted_role.id
 
         await member.add_roles(muted_role, reason="Auto-muted: Exceeded violation threshold")
 
         # Schedule unmute
-        await asyncio.sleep(config["mute_duration"])
-        await member.remove_roles(muted_role, reason="Auto-mute duration expired")
-
-        # Log unmute
-        unmute_embed = discord.Embed(
-            title="🔓 User Auto-Unmuted",
-            description=f"{member.mention} has been unmuted after {config['mute_duration']}s",
-            color=discord.Color.green(),
-            timestamp=datetime.now()
+        await schedule_unmute(guild.id, member.id, time.time() + config["mute_duration"])
+
+    except Exception:
+        log.exception("Error muting user")
+
+
+async def load_pending_unmutes():
+    """Load unmutes that were still pending when the bot last stopped"""
+    async with aiosqlite.connect(UNMUTE_DB) as db:
+        await db.execute(CREATE_UNMUTES_TABLE)
+        await db.commit()
+        async with db.execute("SELECT unmute_at, guild_id, user_id FROM pending_unmutes") as cursor:
+            rows = await cursor.fetchall()
+
+    for unmute_at, guild_id, user_id in rows:
+        pending_unmutes[(guild_id, user_id)] = unmute_at
+        heapq.heappush(unmute_heap, (unmute_at, guild_id, user_id))
+    unmute_event.set()
+
+
+async def write_unmute_db(query, params):
+    """Run a write against the pending unmutes table, creating it if needed"""
+    async with aiosqlite.connect(UNMUTE_DB) as db:
+        await db.execute(CREATE_UNMUTES_TABLE)
+        await db.execute(query, params)
+        await db.commit()
+
+
+async def schedule_unmute(guild_id, user_id, unmute_at):
+    """Queue an unmute and persist it"""
+    # Queue in memory first so the user is unmuted even if persisting fails.
+    # A re-mute supersedes any earlier entry still in the heap.
+    pending_unmutes[(guild_id, user_id)] = unmute_at
+    unmute_retries.pop((guild_id, user_id), None)
+    heapq.heappush(unmute_heap, (unmute_at, guild_id, user_id))
+    unmute_event.set()
+
+    try:
+        await write_unmute_db(
+            "INSERT OR REPLACE INTO pending_unmutes (guild_id, user_id, unmute_at) VALUES (?, ?, ?)",
+            (guild_id, user_id, unmute_at)
         )
-        await log_to_mod_channel(guild, unmute_embed)
+    except Exception:
+        log.exception("Error persisting unmute; it won't survive a restart")
+
+
+async def unmute_worker():
+    """Single background task that lifts mutes as they come due"""
+    # Guilds aren't available until the bot is ready
+    await bot.wait_until_ready()
+    while True:
+        if not unmute_heap:
+            unmute_event.clear()
+            await unmute_event.wait()
+            continue
+
+        unmute_at, guild_id, user_id = unmute_heap[0]
+        delay = unmute_at - time.time()
+        if delay > 0:
+            # Wake early if a sooner unmute gets scheduled
+            unmute_event.clear()
+            try:
+                await asyncio.wait_for(unmute_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        heapq.heappop(unmute_heap)
+        key = (guild_id, user_id)
+        if pending_unmutes.get(key) != unmute_at:
+            continue
+
+        try:
+            await unmute_user(guild_id, user_id)
+        except Exception:
+            # Keep the persisted row and try again later with exponential backoff
+            attempt = unmute_retries.get(key, 0)
+            delay = min(UNMUTE_RETRY_DELAY * 2 ** attempt, UNMUTE_MAX_RETRY_DELAY)
+            log.exception("Error unmuting user %s in guild %s; retrying in %ss", user_id, guild_id, delay)
+            if pending_unmutes.get(key) == unmute_at:
+                unmute_retries[key] = attempt + 1
+                pending_unmutes[key] = time.time() + delay
+                heapq.heappush(unmute_heap, (pending_unmutes[key], guild_id, user_id))
+            continue
+
+        # Only forget the unmute once it has actually happened (and wasn't superseded meanwhile)
+        if pending_unmutes.get(key) != unmute_at:
+            continue
+        del pending_unmutes[key]
+        unmute_retries.pop(key, None)
+        try:
+            await write_unmute_db(
+                "DELETE FROM pending_unmutes WHERE guild_id = ? AND user_id = ?",
+                (guild_id, user_id)
+            )
+        except Exception:
+            log.exception("Error removing persisted unmute")
 
-    except Exception as e:
-        print(f"Error muting user: {e}")
+
+async def unmute_user(guild_id, user_id):
+    """Remove the Muted role from a user and log it"""
+    guild = bot.get_guild(guild_id)
+    if not guild:
+        return
+
+    role_id = muted_role_cache.get(guild.id)
+    muted_role = guild.get_role(role_id) if role_id else discord.utils.get(guild.roles, name="Muted")
+    if not muted_role:
+        return
+
+    member = await resolve_member(guild, user_id)
+    if not member:
+        # User left the server while muted
+        return
+
+    await member.remove_roles(muted_role, reason="Auto-mute duration expired")
+
+    # Log unmute
+    unmute_embed = discord.Embed(
+        title="🔓 User Auto-Unmuted",
+        description=f"{member.mention} has been unmuted after {config['mute_duration']}s",
+        color=discord.Color.green(),
+        timestamp=datetime.now()
+    )
+    await log_to_mod_channel(guild, unmute_embed)
 
 
 # Admin Commands
@@ -299,7 +807,7 @@ async def reset_violations(ctx, member: discord.Member):
 async def show_violations(ctx, member: discord.Member = None):
     """Show violation count for a user or top violators"""
     if member:
-        count = user_violations[member.id]
+        count = user_violations.get(member.id, 0)
         await ctx.send(f"{member.mention} has {count} violation(s)")
     else:
         if not user_violations:
@@ -307,12 +815,12 @@ async def show_violations(ctx, member: discord.Member = None):
             return
 
         # Show top 10 violators
-        sorted_violations = sorted(user_violations.items(), key=lambda x: x[1], reverse=True)[:10]
+        sorted_violations = heapq.nlargest(10, user_violations.items(), key=operator.itemgetter(1))
         embed = discord.Embed(title="📊 Top Violators", color=discord.Color.red())
 
-        for user_id, count in sorted_violations:
-            member = ctx.guild.get_member(user_id)
-            if member:
+        members = await resolve_members(ctx.guild, [user_id for user_id, _ in sorted_violations])
+        for (user_id, count), member in zip(sorted_violations, members):
+            if isinstance(member, discord.Member):
                 embed.add_field(name=str(member), value=f"{count} violations", inline=False)
 
         await ctx.send(embed=embed)
@@ -372,36 +880,46 @@ async def report(interaction: discord.Interaction):
         await interaction.response.send_message(embed=embed)
         return
 
+    # Member lookups may hit the API, so acknowledge the interaction first
+    await interaction.response.defer()
+
     # Sort users by violation count (highest first)
-    sorted_violations = sorted(user_violations.items(), key=lambda x: x[1], reverse=True)
+    total_users = len(user_violations)
+    sorted_violations = heapq.nlargest(25, user_violations.items(), key=operator.itemgetter(1))
 
     embed = discord.Embed(
         title="📊 Censorship Report",
-        description=f"Total censored users: **{len(sorted_violations)}**",
+        description=f"Total censored users: **{total_users}**",
         color=discord.Color.red(),
         timestamp=datetime.now()
     )
 
     # Add up to 25 users (Discord embed field limit)
-    for i, (user_id, count) in enumerate(sorted_violations[:25], 1):
-        member = interaction.guild.get_member(user_id)
-        if member:
+    members = await resolve_members(interaction.guild, [user_id for user_id, _ in sorted_violations])
+    for i, ((user_id, count), member) in enumerate(zip(sorted_violations, members), 1):
+        if isinstance(member, discord.Member):
             embed.add_field(
                 name=f"{i}. {member.name}",
                 value=f"Violations: **{count}**\nID: `{user_id}`",
                 inline=False
             )
-        else:
+        elif member is None:
             embed.add_field(
                 name=f"{i}. Unknown User",
                 value=f"Violations: **{count}**\nID: `{user_id}` (left server)",
                 inline=False
             )
+        else:
+            embed.add_field(
+                name=f"{i}. Unknown User",
+                value=f"Violations: **{count}**\nID: `{user_id}` (lookup failed)",
+                inline=False
+            )
 
-    if len(sorted_violations) > 25:
-        embed.set_footer(text=f"Showing top 25 of {len(sorted_violations)} users")
+    if total_users > 25:
+        embed.set_footer(text=f"Showing top 25 of {total_users} users")
 
-    await interaction.response.send_message(embed=embed)
+    await interaction.followup.send(embed=embed)
 
 
 # Run the bot
@@ -439,4 +957,4 @@ if __name__ == "__main__":
             asyncio.run(run_all())
         else:
             # Running as Background Worker
-            bot.run(token, log_handler=handler, log_level=logging.DEBUG)
+            bot.run(token, log_handler=None)